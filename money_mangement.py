@@ -10,12 +10,17 @@
 # - Download updated Excel with 4 sheets
 
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import pandas as pd
+import numpy as np
 from datetime import date
 import io
+import hashlib
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 
 # ---------------- AUTHENTICATION ---------------- #
-st.set_page_config(page_title="Banking Deposits Tracker", page_icon="💼")
+st.set_page_config(page_title="Banking Deposits Tracker", page_icon="💼", layout="wide")
 
 # Ask for password stored in Streamlit Secrets
 def check_password():
@@ -41,23 +46,44 @@ CUSTOMER_SHEET = "Customer Summary"
 PURCHASE_SHEET = "Purchase Summary"
 DAILY_SHEET = "Daily Summary"
 
+MAIN_COLUMNS = [
+    'Date', 'Customer', 'Deposit Amount', 'Rate', 'Total Amount', 'Amount Paid', 'Outstanding', 'Status'
+]
+NUMERIC_COLUMNS = ['Deposit Amount', 'Rate', 'Total Amount', 'Amount Paid', 'Outstanding']
+CUSTOMER_COLUMNS = ['Customer', 'Total Deposit', 'Total Paid', 'Outstanding', 'Status']
+TOTAL_COLUMNS = ['Total Deposit', 'Total Paid', 'Outstanding', 'Total Amount']
+SUMMED_COLUMNS = ['Deposit Amount', 'Amount Paid', 'Outstanding', 'Total Amount']
+CATEGORY_COLUMNS = ['Customer', 'Status']
+
+# Above this many Main Data rows the export streams through openpyxl's write-only mode
+LARGE_LEDGER_ROWS = 5_000
+# Above this many rows per-customer sums use bincount over category codes instead of groupby
+LARGE_GROUPBY_ROWS = 50_000
+
 # -----------------------------
 # Helpers
 # -----------------------------
 
 def _empty_frames():
-    main = pd.DataFrame(columns=[
-        'Date', 'Customer', 'Deposit Amount', 'Rate', 'Total Amount', 'Amount Paid', 'Outstanding', 'Status'
-    ])
-    customer = pd.DataFrame(columns=['Customer', 'Total Deposit', 'Total Paid', 'Outstanding', 'Status'])
+    main = _as_categories(pd.DataFrame(columns=MAIN_COLUMNS))
+    customer = pd.DataFrame(columns=CUSTOMER_COLUMNS)
     purchase = pd.DataFrame(columns=['Metric', 'Value'])
     daily = pd.DataFrame(columns=['Metric', 'Value'])
     return {MAIN_SHEET: main, CUSTOMER_SHEET: customer, PURCHASE_SHEET: purchase, DAILY_SHEET: daily}
 
 
+def _read_book(file) -> dict:
+    # Rust-based calamine reader first; openpyxl/xlrd default only if it can't handle the file
+    try:
+        return pd.read_excel(file, sheet_name=None, engine='calamine')
+    except Exception:
+        file.seek(0)
+        return pd.read_excel(file, sheet_name=None)
+
+
 def _load_workbook(file) -> dict:
     try:
-        book = pd.read_excel(file, sheet_name=None)
+        book = _read_book(file)
         # Ensure all 4 sheets exist
         frames = _empty_frames()
         for sheet in [MAIN_SHEET, CUSTOMER_SHEET, PURCHASE_SHEET, DAILY_SHEET]:
@@ -68,21 +94,64 @@ def _load_workbook(file) -> dict:
         return _empty_frames()
 
 
+def _as_text(s: pd.Series) -> pd.Series:
+    # str() every non-missing value so mixed text/number columns have a single type
+    s = s.astype(object)
+    return s.where(s.isna(), s.astype(str))
+
+
+def _as_categories(df: pd.DataFrame) -> pd.DataFrame:
+    # Low-cardinality text columns as categoricals so groupby hashes integer codes
+    for c in CATEGORY_COLUMNS:
+        if c in df.columns:
+            df[c] = _as_text(df[c]).astype('category')
+    return df
+
+
+def _recompute_row_fields(df: pd.DataFrame) -> pd.DataFrame:
+    # Re-derive Total Amount / Outstanding / Status for every row with NumPy ufuncs
+    total = df['Deposit Amount'].to_numpy(dtype=float) * df['Rate'].to_numpy(dtype=float)
+    # Not clipped: an overpayment is stored negative and offsets the customer's earlier debt
+    outstanding = total - df['Amount Paid'].to_numpy(dtype=float)
+    df['Total Amount'] = total
+    df['Outstanding'] = outstanding
+    df['Status'] = np.where(outstanding <= 0, 'Paid', 'Not Paid')
+    return df
+
+
 def _sanitize_types(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return df
     df = df.copy()
-    # Date to date
+    # Date to date (format='mixed': parse each value on its own, as pandas < 2 did)
     if 'Date' in df.columns:
-        df['Date'] = pd.to_datetime(df['Date'], errors='coerce').dt.date
-    # Numeric columns
-    for c in ['Deposit Amount', 'Rate', 'Total Amount', 'Amount Paid', 'Outstanding']:
-        if c in df.columns:
-            df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0.0)
-    # Status
-    if 'Outstanding' in df.columns:
-        df['Status'] = df['Outstanding'].apply(lambda x: 'Paid' if x <= 0 else 'Not Paid')
-    return df
+        df['Date'] = pd.to_datetime(df['Date'], errors='coerce', format='mixed').dt.date
+    # Numeric columns (coerced in one batched pass)
+    num_cols = [c for c in NUMERIC_COLUMNS if c in df.columns]
+    if num_cols:
+        df[num_cols] = df[num_cols].apply(pd.to_numeric, errors='coerce').fillna(0.0)
+    # Derived fields (Status only, if the inputs are missing)
+    if {'Deposit Amount', 'Rate', 'Amount Paid'}.issubset(df.columns):
+        df = _recompute_row_fields(df)
+    elif 'Outstanding' in df.columns:
+        df['Status'] = np.where(df['Outstanding'].to_numpy() <= 0, 'Paid', 'Not Paid')
+    return _as_categories(df)
+
+
+def _sum_by_customer(main: pd.DataFrame) -> pd.DataFrame:
+    # One row per observed customer (NaN included) with the SUMMED_COLUMNS totals
+    if len(main) <= LARGE_GROUPBY_ROWS:
+        return main.groupby('Customer', dropna=False, sort=False, observed=True)[SUMMED_COLUMNS].sum().reset_index()
+    # Large ledgers: a single weighted bincount pass per column over the categorical codes
+    categories = main['Customer'].cat.categories
+    codes = main['Customer'].cat.codes.to_numpy()
+    n = len(categories)
+    codes = np.where(codes < 0, n, codes)  # NaN customers get their own group
+    # Observed groups in first-appearance order, matching groupby(sort=False)
+    order = pd.unique(codes)
+    sums = {c: np.bincount(codes, weights=main[c].to_numpy(dtype=float), minlength=n + 1)[order] for c in SUMMED_COLUMNS}
+    customers = np.append(categories.to_numpy(dtype=object), np.nan)[order]
+    return pd.DataFrame({'Customer': customers, **sums})
 
 
 def _recompute_from_main(main_df: pd.DataFrame, expense: float, other_expense: float) -> dict:
@@ -90,24 +159,26 @@ def _recompute_from_main(main_df: pd.DataFrame, expense: float, other_expense: f
 
     # --- Customer Summary
     if main.empty:
-        cust = pd.DataFrame(columns=['Customer', 'Total Deposit', 'Total Paid', 'Outstanding', 'Status'])
+        cust = pd.DataFrame(columns=CUSTOMER_COLUMNS)
         paid_total = 0.0
         outstanding_total = 0.0
         total_amount_sum = 0.0
     else:
-        grp = main.groupby('Customer', dropna=False).agg({
-            'Deposit Amount': 'sum',
-            'Amount Paid': 'sum',
-            'Outstanding': 'sum',
-            'Total Amount': 'sum'
-        }).reset_index()
+        grp = _sum_by_customer(main)
         grp.rename(columns={'Deposit Amount': 'Total Deposit', 'Amount Paid': 'Total Paid'}, inplace=True)
-        grp['Status'] = grp['Outstanding'].apply(lambda x: 'Paid' if x <= 0 else 'Not Paid')
-        cust = grp[['Customer', 'Total Deposit', 'Total Paid', 'Outstanding', 'Status']]
-        paid_total = main['Amount Paid'].sum()
-        outstanding_total = main['Outstanding'].sum()
-        total_amount_sum = main['Total Amount'].sum()
+        grp['Status'] = np.where(grp['Outstanding'].to_numpy() <= 0, 'Paid', 'Not Paid')
+        cust = grp[CUSTOMER_COLUMNS]
+        # Totals from the per-customer rows (dropna=False keeps every ledger row in a group)
+        paid_total = float(cust['Total Paid'].sum())
+        outstanding_total = float(cust['Outstanding'].sum())
+        total_amount_sum = float(grp['Total Amount'].sum())
+
+    purchase, daily = _summary_frames(total_amount_sum, paid_total, outstanding_total, expense, other_expense)
+    return {MAIN_SHEET: main, CUSTOMER_SHEET: cust, PURCHASE_SHEET: purchase, DAILY_SHEET: daily}
 
+
+def _summary_frames(total_amount_sum: float, paid_total: float, outstanding_total: float,
+                    expense: float, other_expense: float):
     # --- Purchase/Payment Summary
     purchase = pd.DataFrame({
         'Metric': [
@@ -133,21 +204,142 @@ def _recompute_from_main(main_df: pd.DataFrame, expense: float, other_expense: f
         'Metric': ['Expense', 'Other Expense', 'Sum of Total Amount', 'Total Paid', 'Profit'],
         'Value': [expense, other_expense, total_amount_sum, paid_total, profit]
     })
+    return purchase, daily
+
+
+def _customer_totals(main: pd.DataFrame) -> dict:
+    # Running per-customer sums; patched per entry instead of regrouping the ledger
+    if main.empty:
+        return {}
+    grp = _sum_by_customer(main).set_index('Customer')
+    grp.rename(columns={'Deposit Amount': 'Total Deposit', 'Amount Paid': 'Total Paid'}, inplace=True)
+    return grp[TOTAL_COLUMNS].to_dict(orient='index')
+
+
+def _add_to_totals(totals: dict, row: dict) -> None:
+    t = totals.setdefault(row['Customer'], dict.fromkeys(TOTAL_COLUMNS, 0.0))
+    t['Total Deposit'] += row['Deposit Amount']
+    t['Total Paid'] += row['Amount Paid']
+    t['Outstanding'] += row['Outstanding']
+    t['Total Amount'] += row['Total Amount']
+
+
+def _frames_from_totals(main: pd.DataFrame, totals: dict, expense: float, other_expense: float) -> dict:
+    cust = pd.DataFrame.from_dict(totals, orient='index', columns=TOTAL_COLUMNS).rename_axis('Customer').reset_index()
+    cust['Status'] = np.where(cust['Outstanding'].to_numpy() <= 0, 'Paid', 'Not Paid')
+    purchase, daily = _summary_frames(
+        float(cust['Total Amount'].sum()), float(cust['Total Paid'].sum()), float(cust['Outstanding'].sum()),
+        expense, other_expense,
+    )
+    return {MAIN_SHEET: main, CUSTOMER_SHEET: cust[CUSTOMER_COLUMNS], PURCHASE_SHEET: purchase, DAILY_SHEET: daily}
+
+
+def _sheet_rows(df: pd.DataFrame):
+    # Plain Python rows (NaN -> None) for row-ordered writes; pandas' to_excel goes column by column
+    cells = df.astype(object).where(df.notna(), None)
+    return cells.itertuples(index=False, name=None)
+
+
+def _write_sheet_xlsxwriter(book, name: str, df: pd.DataFrame, header_fmt) -> None:
+    ws = book.add_worksheet(name)
+    ws.write_row(0, 0, list(df.columns), header_fmt)
+    for i, row in enumerate(_sheet_rows(df), start=1):
+        ws.write_row(i, 0, row)
 
-    return {MAIN_SHEET: main, CUSTOMER_SHEET: cust, PURCHASE_SHEET: purchase, DAILY_SHEET: daily}
+
+def _write_sheet_openpyxl(book, name: str, df: pd.DataFrame) -> None:
+    ws = book.create_sheet(name)
+    header = []
+    for col in df.columns:
+        cell = WriteOnlyCell(ws, value=col)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+    for row in _sheet_rows(df):
+        ws.append(row)
 
 
 def _to_excel_bytes(frames: dict) -> bytes:
     buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
+    if len(frames[MAIN_SHEET]) > LARGE_LEDGER_ROWS:
+        engine, engine_kwargs = 'openpyxl', {'write_only': True}
+    else:
+        engine, engine_kwargs = 'xlsxwriter', {'options': {'constant_memory': True, 'strings_to_numbers': False}}
+    with pd.ExcelWriter(buffer, engine=engine, engine_kwargs=engine_kwargs) as writer:
+        header_fmt = writer.book.add_format({'bold': True}) if engine == 'xlsxwriter' else None
         for name, df in frames.items():
             # order columns neatly for main
             if name == MAIN_SHEET and not df.empty:
-                df = df[['Date','Customer','Deposit Amount','Rate','Total Amount','Amount Paid','Outstanding','Status']]
-            df.to_excel(writer, sheet_name=name, index=False)
+                df = df[MAIN_COLUMNS].copy()
+                # ISO strings skip the writers' per-cell datetime handling; read back via _sanitize_types
+                # (missing dates stay empty cells rather than the text 'NaT')
+                df['Date'] = df['Date'].map(lambda d: d.isoformat() if pd.notna(d) else None)
+            if engine == 'openpyxl':
+                _write_sheet_openpyxl(writer.book, name, df)
+            else:
+                _write_sheet_xlsxwriter(writer.book, name, df, header_fmt)
     buffer.seek(0)
     return buffer.read()
 
+
+def _store_main(df: pd.DataFrame) -> None:
+    # The ledger lives in session state as compressed Parquet, hydrated on demand.
+    # Extra user columns from an uploaded sheet may mix text and numbers, which Arrow rejects.
+    extra = [c for c in df.columns if c not in MAIN_COLUMNS and df[c].dtype == object]
+    if extra:
+        df = df.copy()
+        for c in extra:
+            df[c] = _as_text(df[c])
+    try:
+        st.session_state.main_bytes = df.to_parquet(engine='pyarrow', compression='zstd', index=False)
+        st.session_state.main_frame = None
+    except Exception:
+        # Keep the live frame rather than failing the whole app
+        st.session_state.main_bytes = None
+        st.session_state.main_frame = df
+
+
+def _load_main() -> pd.DataFrame:
+    if st.session_state.main_bytes is None:
+        return st.session_state.main_frame
+    return pd.read_parquet(io.BytesIO(st.session_state.main_bytes), engine='pyarrow')
+
+
+def _flush_pending_rows() -> pd.DataFrame:
+    # Fold the buffered entries into the ledger with a single concat
+    main = _load_main()
+    if st.session_state.pending_rows:
+        pending = pd.DataFrame(st.session_state.pending_rows, columns=MAIN_COLUMNS)
+        # (concat with the empty starter frame is deprecated and would skew dtypes)
+        merged = pd.concat([main, pending], ignore_index=True) if not main.empty else pending
+        main = _as_categories(merged)
+        _store_main(main)
+        st.session_state.pending_rows = []
+    return main
+
+
+def _frame_fingerprint(df: pd.DataFrame) -> str:
+    # Digest of the per-row hashes (index included, so reordered rows differ)
+    return hashlib.blake2b(pd.util.hash_pandas_object(df, index=True).values.tobytes(), digest_size=16).hexdigest()
+
+
+# Shared across sessions, so keep only a handful of recent workbooks.
+# Keyed on the caller's fingerprint; the leading underscore keeps Streamlit from re-hashing the frame.
+@st.cache_data(show_spinner=False, max_entries=8)
+def _cached_export(fingerprint: str, _main_df: pd.DataFrame, expense: float, other_expense: float) -> bytes:
+    # Reruns with an unchanged ledger & expenses reuse the Excel bytes
+    return _to_excel_bytes(_recompute_from_main(_main_df, expense, other_expense))
+
+
+def _session_export(main_df: pd.DataFrame, expense: float, other_expense: float) -> bytes:
+    # Per-session early exit ahead of the shared cache, which copies its value out on every hit
+    fingerprint = _frame_fingerprint(main_df)
+    key = (fingerprint, expense, other_expense)
+    if st.session_state.get('_recomp_key') != key:
+        st.session_state._recomp_val = _cached_export(fingerprint, main_df, expense, other_expense)
+        st.session_state._recomp_key = key
+    return st.session_state._recomp_val
+
 # -----------------------------
 # Load/Init Data
 # -----------------------------
@@ -155,34 +347,28 @@ with st.sidebar:
     st.markdown("### 📦 Workbook Source")
     uploaded = st.file_uploader("Upload existing Excel (optional)", type=["xlsx", "xlsm", "xls"])
 
-if uploaded:
-    frames = _load_workbook(uploaded)
-else:
-    frames = _empty_frames()
-
-# Persist frames in session
-if 'frames' not in st.session_state:
+# Persist frames in session; (re)load only on first run or when a new file is uploaded.
+# Main Data is kept as Parquet bytes (see _store_main); the small sheets stay as frames.
+upload_key = uploaded.file_id if uploaded else None
+if 'frames' not in st.session_state or (uploaded and upload_key != st.session_state.get('upload_key')):
+    frames = _load_workbook(uploaded) if uploaded else _empty_frames()
+    main = _sanitize_types(frames.pop(MAIN_SHEET))
+    _store_main(main)
     st.session_state.frames = frames
-else:
-    # Merge freshly loaded frames when new upload happens
-    if uploaded:
-        st.session_state.frames = frames
+    st.session_state.customer_totals = _customer_totals(main)
+    st.session_state.pending_rows = []
+    st.session_state.upload_key = upload_key
 
 frames = st.session_state.frames
-main_df = _sanitize_types(frames[MAIN_SHEET])
 
 # -----------------------------
 # Sidebar: Expenses & Controls
 # -----------------------------
 with st.sidebar:
     st.markdown("### 💸 Expenses (Today)")
-    expense = st.number_input("Expense", min_value=0.0, value=float(frames[DAILY_SHEET]['Value'][0]) if not frames[DAILY_SHEET].empty and 'Expense' in frames[DAILY_SHEET]['Metric'].values else 0.0, step=100.0)
-    other_expense = st.number_input("Other Expense", min_value=0.0, value=float(frames[DAILY_SHEET]['Value'][1]) if not frames[DAILY_SHEET].empty and 'Other Expense' in frames[DAILY_SHEET]['Metric'].values else 0.0, step=100.0)
-    st.markdown("---")
-    st.markdown("### 💾 Export")
-    recomputed = _recompute_from_main(main_df, expense, other_expense)
-    export_bytes = _to_excel_bytes(recomputed)
-    st.download_button("⬇️ Download Updated Excel", data=export_bytes, file_name="banking_tracker.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    daily_map = dict(zip(frames[DAILY_SHEET]['Metric'], frames[DAILY_SHEET]['Value'])) if not frames[DAILY_SHEET].empty else {}
+    expense = st.number_input("Expense", min_value=0.0, value=float(daily_map.get('Expense', 0.0)), step=100.0)
+    other_expense = st.number_input("Other Expense", min_value=0.0, value=float(daily_map.get('Other Expense', 0.0)), step=100.0)
 
 # -----------------------------
 # Main Layout
@@ -192,101 +378,136 @@ with colA:
     st.title("💼 Banking / Deposits Tracker")
     st.caption("Per-transaction daily entries → auto summaries & profit. Upload previous workbook or start fresh.")
 
-# -----------------------------
-# Entry Form (Per Transaction, Per Day)
-# -----------------------------
-with st.expander("➕ Add Transaction", expanded=True):
-    form = st.form("entry_form")
-    c1, c2, c3 = form.columns([1, 1, 1])
-
-    entry_date = c1.date_input("Date", value=date.today())
-
-    # Customer dropdown with "+ Add new" option
-    existing_customers = sorted([x for x in main_df['Customer'].dropna().unique()]) if not main_df.empty else []
-    options = ["+ Add new customer"] + existing_customers
-    selected = c2.selectbox("Customer", options)
-    if selected == "+ Add new customer":
-        customer = c2.text_input("New Customer Name", key="new_customer_input")
+# Entry form + dashboards rerun on their own when an entry is added
+@st.fragment
+def ledger_view(expense: float, other_expense: float):
+    # Commit / Prepare clicks fold the pending buffer in before anything renders
+    if st.session_state.get('commit_batch') or st.session_state.get('prepare_export'):
+        main_df = _flush_pending_rows()
     else:
-        customer = selected
+        main_df = _load_main()
+    pending_rows = st.session_state.pending_rows
+
+    # -----------------------------
+    # Entry Form (Per Transaction, Per Day)
+    # -----------------------------
+    with st.expander("➕ Add Transaction", expanded=True):
+        form = st.form("entry_form")
+        c1, c2, c3 = form.columns([1, 1, 1])
+
+        entry_date = c1.date_input("Date", value=date.today())
+
+        # Customer dropdown with "+ Add new" option
+        # (categories of the categorical Customer column are already the sorted unique names)
+        existing_customers = main_df['Customer'].cat.categories.tolist() if not main_df.empty else []
+        pending_customers = {r['Customer'] for r in pending_rows}.difference(existing_customers)
+        if pending_customers:
+            existing_customers = sorted(existing_customers + list(pending_customers))
+        options = ["+ Add new customer"] + existing_customers
+        selected = c2.selectbox("Customer", options)
+        if selected == "+ Add new customer":
+            customer = c2.text_input("New Customer Name", key="new_customer_input")
+        else:
+            customer = selected
+
+        deposit = c3.number_input("Deposit Amount", min_value=0.0, step=100.0)
+
+        c4, c5, c6 = form.columns([1, 1, 1])
+        rate = c4.number_input("Rate (currency rate for this entry)", min_value=0.0, step=0.1)
+        amount_paid = c5.number_input("Amount Paid (optional)", min_value=0.0, step=100.0, value=0.0)
+
+        # Live preview
+        total_amount = deposit * rate
+        outstanding = max(total_amount - amount_paid, 0.0)
+        status = "Paid" if outstanding <= 0.0 and total_amount > 0 else ("Not Paid" if total_amount > 0 else "-")
+
+        c4.metric("Total Amount", f"{total_amount:,.2f}")
+        c5.metric("Outstanding", f"{outstanding:,.2f}")
+        c6.metric("Status", status)
+
+        submitted = form.form_submit_button("Add Entry")
+
+        if submitted:
+            if not customer or customer.strip() == "":
+                st.error("Please enter a customer name.")
+            else:
+                new_row = {
+                    'Date': entry_date,
+                    'Customer': customer.strip(),
+                    'Deposit Amount': deposit,
+                    'Rate': rate,
+                    'Total Amount': total_amount,
+                    'Amount Paid': amount_paid,
+                    'Outstanding': total_amount - amount_paid,
+                    'Status': 'Paid' if (total_amount - amount_paid) <= 0 else 'Not Paid'
+                }
+                pending_rows.append(new_row)
+                _add_to_totals(st.session_state.customer_totals, new_row)
+                st.success("Entry added and summaries updated.")
+                try:
+                    st.rerun(scope="fragment")
+                except StreamlitAPIException:
+                    # Submit handled during a full-app run (e.g. merged reruns): rerun everything
+                    st.rerun()
+
+    # -----------------------------
+    # Dashboards
+    # -----------------------------
+    re_frames = _frames_from_totals(main_df, st.session_state.customer_totals, expense, other_expense)
+
+    # Top KPIs
+    k1, k2, k3, k4 = st.columns(4)
+    # (from the totals-based summary, so pending entries are included)
+    purchase_df = re_frames[PURCHASE_SHEET]
+    purchase_map = dict(zip(purchase_df['Metric'], purchase_df['Value']))
+    sum_total_amt = float(purchase_map['Total Amount (Σ deposit*rate)'])
+    sum_paid = float(purchase_map['Total Paid'])
+    sum_out = float(purchase_map['Total Outstanding'])
+
+    k1.metric("Σ Total Amount", f"{sum_total_amt:,.2f}")
+    k2.metric("Σ Paid", f"{sum_paid:,.2f}")
+    k3.metric("Σ Outstanding", f"{sum_out:,.2f}")
+
+    # Profit from Daily sheet
+    daily_df = re_frames[DAILY_SHEET]
+    profit_val = float(dict(zip(daily_df['Metric'], daily_df['Value'])).get('Profit', 0.0))
+    k4.metric("Profit", f"{profit_val:,.2f}")
 
-    deposit = c3.number_input("Deposit Amount", min_value=0.0, step=100.0)
+    st.markdown("---")
 
-    c4, c5, c6 = form.columns([1, 1, 1])
-    rate = c4.number_input("Rate (currency rate for this entry)", min_value=0.0, step=0.1)
-    amount_paid = c5.number_input("Amount Paid (optional)", min_value=0.0, step=100.0, value=0.0)
+    # Tables
+    t1, t2 = st.tabs(["📄 Main Data", "👤 Customer Summary"])
+    with t1:
+        st.dataframe(re_frames[MAIN_SHEET], use_container_width=True)
+        if pending_rows:
+            st.caption(f"🕒 {len(pending_rows)} pending entries (not yet committed to Main Data)")
+            st.dataframe(pd.DataFrame(pending_rows), use_container_width=True)
+    with t2:
+        st.dataframe(re_frames[CUSTOMER_SHEET], use_container_width=True)
 
-    # Live preview
-    total_amount = deposit * rate
-    outstanding = max(total_amount - amount_paid, 0.0)
-    status = "Paid" if outstanding <= 0.0 and total_amount > 0 else ("Not Paid" if total_amount > 0 else "-")
+    st.markdown("---")
 
-    c4.metric("Total Amount", f"{total_amount:,.2f}")
-    c5.metric("Outstanding", f"{outstanding:,.2f}")
-    c6.metric("Status", status)
+    cA, cB = st.columns(2)
+    with cA:
+        st.subheader("📦 Purchase / Payment Summary")
+        st.dataframe(re_frames[PURCHASE_SHEET], use_container_width=True)
+    with cB:
+        st.subheader("📆 Daily Summary")
+        st.dataframe(re_frames[DAILY_SHEET], use_container_width=True)
 
-    submitted = form.form_submit_button("Add Entry")
+    st.markdown("---")
 
-    if submitted:
-        if not customer or customer.strip() == "":
-            st.error("Please enter a customer name.")
-        else:
-            new_row = pd.DataFrame([{
-                'Date': entry_date,
-                'Customer': customer.strip(),
-                'Deposit Amount': deposit,
-                'Rate': rate,
-                'Total Amount': total_amount,
-                'Amount Paid': amount_paid,
-                'Outstanding': total_amount - amount_paid,
-                'Status': 'Paid' if (total_amount - amount_paid) <= 0 else 'Not Paid'
-            }])
-            updated_main = pd.concat([main_df, new_row], ignore_index=True)
-            st.session_state.frames = _recompute_from_main(updated_main, expense, other_expense)
-            st.success("Entry added and summaries updated.")
-            st.experimental_rerun()
+    # Export (inside the fragment so the download always reflects fragment-scoped reruns);
+    # the workbook is only serialized once the user asks for it
+    st.markdown("### 💾 Export")
+    if pending_rows:
+        st.caption(f"{len(pending_rows)} pending entries will be committed when the workbook is prepared.")
+        st.button("✅ Commit batch", key="commit_batch")
+    if st.button("📄 Prepare Excel", key="prepare_export"):
+        export_bytes = _session_export(main_df, expense, other_expense)
+        st.download_button("⬇️ Download Updated Excel", data=export_bytes, file_name="banking_tracker.xlsx", mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
 
-# -----------------------------
-# Dashboards
-# -----------------------------
-re_frames = st.session_state.frames
-
-# Top KPIs
-k1, k2, k3, k4 = st.columns(4)
-main_now = re_frames[MAIN_SHEET]
-if not main_now.empty:
-    sum_total_amt = float(main_now['Total Amount'].sum())
-    sum_paid = float(main_now['Amount Paid'].sum())
-    sum_out = float(main_now['Outstanding'].sum())
-else:
-    sum_total_amt = sum_paid = sum_out = 0.0
-
-k1.metric("Σ Total Amount", f"{sum_total_amt:,.2f}")
-k2.metric("Σ Paid", f"{sum_paid:,.2f}")
-k3.metric("Σ Outstanding", f"{sum_out:,.2f}")
-
-# Profit from Daily sheet
-daily_df = re_frames[DAILY_SHEET]
-profit_val = float(daily_df.loc[daily_df['Metric']=='Profit','Value'].iloc[0]) if not daily_df.empty and 'Profit' in daily_df['Metric'].values else 0.0
-k4.metric("Profit", f"{profit_val:,.2f}")
-
-st.markdown("---")
-
-# Tables
-t1, t2 = st.tabs(["📄 Main Data", "👤 Customer Summary"])
-with t1:
-    st.dataframe(re_frames[MAIN_SHEET], use_container_width=True)
-with t2:
-    st.dataframe(re_frames[CUSTOMER_SHEET], use_container_width=True)
-
-st.markdown("---")
-
-cA, cB = st.columns(2)
-with cA:
-    st.subheader("📦 Purchase / Payment Summary")
-    st.dataframe(re_frames[PURCHASE_SHEET], use_container_width=True)
-with cB:
-    st.subheader("📆 Daily Summary")
-    st.dataframe(re_frames[DAILY_SHEET], use_container_width=True)
-
-st.caption("Tip: Upload your last saved Excel in the sidebar to continue from previous data. Use the download button to export the updated workbook with all four sheets.")
+
+ledger_view(expense, other_expense)
+
+st.caption("Tip: Upload your last saved Excel in the sidebar to continue from previous data. Use Prepare Excel to export the updated workbook with all four sheets.")